@@ -2,18 +2,42 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from functools import lru_cache, partial
 from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
+from pandas.tseries.frequencies import to_offset
 from openstef_dbc.data_interface import _DataInterface
 from openstef_dbc.services.weather import Weather
 from openstef_dbc.utils import (
+    cache_dataframe,
     genereate_datetime_index,
     process_datetime_range,
     parse_influx_result,
+    to_flux_duration,
 )
 
+WEATHER_PARAMS = (
+    "clouds",
+    "radiation",
+    "temp",
+    "winddeg",
+    "windspeed",
+    "windspeed_100m",
+    "pressure",
+    "humidity",
+    "rain",
+    "mxlD",
+    "snowDepth",
+    "clearSky_ulf",
+    "clearSky_dlf",
+    "ssrunoff",
+)
+WEATHER_DROP_COLUMNS = frozenset({"source"})
+
 
 class PredictorGroups(Enum):
     MARKET_DATA = "market_data"
@@ -21,6 +45,66 @@ class PredictorGroups(Enum):
     LOAD_PROFILES = "load_profiles"
 
 
+@lru_cache(maxsize=32)
+def _normalize_predictor_groups(
+    predictor_groups: Tuple[Union[PredictorGroups, str], ...],
+) -> Tuple[PredictorGroups, ...]:
+    return tuple(PredictorGroups(p) for p in predictor_groups)
+
+
+def _process_datetime_range(
+    datetime_start: datetime.datetime,
+    datetime_end: datetime.datetime,
+    forecast_resolution: Optional[str],
+) -> Tuple[datetime.datetime, datetime.datetime, pd.DatetimeIndex]:
+    # Equal instants in different timezones hash equal, but the index takes its
+    # timezone from the start, so the timezone has to be part of the cache key
+    return _cached_process_datetime_range(
+        datetime_start, datetime_start.tzinfo, datetime_end, forecast_resolution
+    )
+
+
+@lru_cache(maxsize=256)
+def _cached_process_datetime_range(
+    datetime_start: datetime.datetime,
+    tzinfo: Optional[datetime.tzinfo],
+    datetime_end: datetime.datetime,
+    forecast_resolution: Optional[str],
+) -> Tuple[datetime.datetime, datetime.datetime, pd.DatetimeIndex]:
+    # Datetimes and DatetimeIndex are immutable, so the cached result can be shared
+    return process_datetime_range(
+        start=datetime_start, end=datetime_end, freq=forecast_resolution
+    )
+
+
+@lru_cache(maxsize=64)
+def _build_empty_frame(
+    datetime_start: datetime.datetime,
+    tzinfo: Optional[datetime.tzinfo],
+    datetime_end: datetime.datetime,
+    forecast_resolution: Optional[str],
+) -> pd.DataFrame:
+    return pd.DataFrame(
+        index=genereate_datetime_index(
+            start=datetime_start, end=datetime_end, freq=forecast_resolution
+        )
+    )
+
+
+def _empty_frame(
+    datetime_start: datetime.datetime,
+    datetime_end: datetime.datetime,
+    forecast_resolution: Optional[str],
+) -> pd.DataFrame:
+    """Get an empty frame on the requested index, used when there is no data."""
+    # The index takes its timezone from the start, so it is part of the cache key
+    empty_frame = _build_empty_frame(
+        datetime_start, datetime_start.tzinfo, datetime_end, forecast_resolution
+    )
+    # Copy so callers can not modify the cached frame (or its index)
+    return empty_frame.copy()
+
+
 class Predictor:
     def get_predictors(
         self,
@@ -48,48 +132,72 @@ class Predictor:
                 None or not given all predictor groups will be returned. Defaults to None.
 
         Returns:
-            pd.DataFrame: Requested predictors with timezone aware datetime index.
+            pd.DataFrame: Requested predictors (float32) with timezone aware datetime
+                index.
         """
 
         # Process datetimes (rounded, timezone, frequency) and generate index
-        datetime_start, datetime_end, datetime_index = process_datetime_range(
-            start=datetime_start,
-            end=datetime_end,
-            freq=forecast_resolution,
+        datetime_start, datetime_end, datetime_index = _process_datetime_range(
+            datetime_start, datetime_end, forecast_resolution
         )
         if predictor_groups is None:
-            predictor_groups = [p for p in PredictorGroups]
+            predictor_groups = tuple(PredictorGroups)
 
         # convert strings to enums if required
-        predictor_groups = [PredictorGroups(p) for p in predictor_groups]
+        predictor_groups = _normalize_predictor_groups(tuple(predictor_groups))
 
         if PredictorGroups.WEATHER_DATA in predictor_groups and location is None:
             raise ValueError(
                 "Need to provide a location when weather data predictors are requested."
             )
-        predictors = []
 
-        if PredictorGroups.WEATHER_DATA in predictor_groups:
-            weather_data_predictors = self.get_weather_data(
+        # The groups are fetched from independent sources, so retrieve them
+        # concurrently instead of waiting for each query in turn
+        fetchers = {
+            PredictorGroups.WEATHER_DATA: partial(
+                self.get_weather_data,
                 datetime_start,
                 datetime_end,
                 location=location,
                 country=country,
                 forecast_resolution=forecast_resolution,
-            )
-            predictors.append(weather_data_predictors)
-
-        if PredictorGroups.MARKET_DATA in predictor_groups:
-            market_data_predictors = self.get_market_data(
-                datetime_start, datetime_end, forecast_resolution=forecast_resolution
-            )
-            predictors.append(market_data_predictors)
-
-        if PredictorGroups.LOAD_PROFILES in predictor_groups:
-            load_profiles_predictors = self.get_load_profiles(
-                datetime_start, datetime_end, forecast_resolution=forecast_resolution
-            )
-            predictors.append(load_profiles_predictors)
+            ),
+            PredictorGroups.MARKET_DATA: partial(
+                self.get_market_data,
+                datetime_start,
+                datetime_end,
+                forecast_resolution=forecast_resolution,
+            ),
+            PredictorGroups.LOAD_PROFILES: partial(
+                self.get_load_profiles,
+                datetime_start,
+                datetime_end,
+                forecast_resolution=forecast_resolution,
+            ),
+        }
+        requested_fetchers = [
+            fetcher for group, fetcher in fetchers.items() if group in predictor_groups
+        ]
+        # A single group does not need a thread pool
+        if len(requested_fetchers) > 1:
+            with ThreadPoolExecutor(max_workers=len(requested_fetchers)) as executor:
+                futures = [executor.submit(fetcher) for fetcher in requested_fetchers]
+            results = [future.result() for future in futures]
+        else:
+            results = [fetcher() for fetcher in requested_fetchers]
+
+        # Name the index like the parsed influx results. rename returns a new index,
+        # so the cached datetime_index is left untouched
+        target_index = datetime_index.rename("datetime")
+
+        # Results are in submission order to keep a stable column order. Each group is
+        # aligned on the requested index, so the concat only has to stack columns.
+        # float32 is precise enough for the predictors and halves their memory, a
+        # single numpy float dtype also keeps concatenating predictors cheap
+        predictors = [
+            result.astype(np.float32, copy=False).reindex(target_index)
+            for result in results
+        ]
 
         return pd.concat(predictors, axis=1)
 
@@ -111,6 +219,10 @@ class Predictor:
         datetime_end: datetime.datetime,
         forecast_resolution: str = None,
     ) -> pd.DataFrame:
+        # Flux can not query an empty range, skip the round-trip
+        if datetime_start >= datetime_end:
+            return _empty_frame(datetime_start, datetime_end, forecast_resolution)
+
         bind_params = {
             "_start": datetime_start,
             "_stop": datetime_end,
@@ -121,6 +233,15 @@ class Predictor:
                 |> range(start: {bind_params["_start"].strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {bind_params["_stop"].strftime('%Y-%m-%dT%H:%M:%SZ')}) 
                 |> filter(fn: (r) => r._measurement == "marketprices" and r._field == "Price" and r.Name=="APX")
         """
+        # Let influx downsample to the requested resolution, upsampling is done below
+        if forecast_resolution:
+            query += f"""
+                |> aggregateWindow(every: {to_flux_duration(forecast_resolution)}, fn: first, timeSrc: "_start", createEmpty: false)
+            """
+        # Only return the columns that are used, not the (string) tags
+        query += """
+                |> keep(columns: ["_time", "_field", "_value"])
+        """
 
         result = _DataInterface.get_instance().exec_influx_query(query, bind_params)
 
@@ -132,14 +253,10 @@ class Predictor:
         if not result.empty:
             electricity_price = parse_influx_result(result)
         else:
-            return pd.DataFrame(
-                index=genereate_datetime_index(
-                    start=datetime_start, end=datetime_end, freq=forecast_resolution
-                )
-            )
-        electricity_price.rename(columns=dict(Price="APX"), inplace=True)
+            return _empty_frame(datetime_start, datetime_end, forecast_resolution)
+        electricity_price = electricity_price.rename(columns=dict(Price="APX"))
 
-        if forecast_resolution and electricity_price.empty is False:
+        if forecast_resolution:
             electricity_price = electricity_price.resample(forecast_resolution).ffill()
 
         return electricity_price
@@ -160,10 +277,32 @@ class Predictor:
             the SJV (Standaard Jaarverbruik) profiles from NEDU.) For more information see:
             https://www.mffbas.nl/documenten/
 
+            Query results are cached for a limited time, as the profiles rarely change.
+
         Returns:
             pandas.DataFrame: TDCV load profiles (if available)
 
         """
+        # Flux can not query an empty range, skip the round-trip
+        if datetime_start >= datetime_end:
+            return _empty_frame(datetime_start, datetime_end, forecast_resolution)
+
+        load_profiles = self._get_load_profiles(
+            datetime_start, datetime_end, forecast_resolution
+        )
+        if load_profiles.empty:
+            return _empty_frame(datetime_start, datetime_end, forecast_resolution)
+
+        return load_profiles
+
+    @staticmethod
+    @cache_dataframe()
+    def _get_load_profiles(
+        datetime_start: datetime.datetime,
+        datetime_end: datetime.datetime,
+        forecast_resolution: str = None,
+    ) -> pd.DataFrame:
+        """Get load profiles, cached as the profiles rarely change."""
         # select all fields which start with 'sjv'
         # (there is also a 'year_created' tag in this measurement)
         bind_params = {
@@ -210,7 +349,8 @@ class Predictor:
             |> range(start: {bind_params["_start"].strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {bind_params["_stop"].strftime('%Y-%m-%dT%H:%M:%SZ')}) 
             |> filter(fn: (r) => r["_measurement"] == "sjv")
             |> filter(fn: (r) => r["_field"] == "{field_selection}")
-            |> aggregateWindow(every: {forecast_resolution[:-3]}m, fn: mean, createEmpty: false)
+            |> aggregateWindow(every: {to_flux_duration(forecast_resolution)}, fn: mean, createEmpty: false)
+            |> keep(columns: ["_time", "_field", "_value"])
             |> yield(name: "mean")
         
         """
@@ -221,16 +361,11 @@ class Predictor:
         if isinstance(result, list):
             result = pd.concat(result)[["_value", "_field", "_time"]]
 
-        if not result.empty:
-            load_profiles = parse_influx_result(result)
-        else:
-            return pd.DataFrame(
-                index=genereate_datetime_index(
-                    start=datetime_start, end=datetime_end, freq=forecast_resolution
-                )
-            )
+        if result.empty:
+            return pd.DataFrame()
 
-        if forecast_resolution and load_profiles.empty is False:
+        load_profiles = parse_influx_result(result)
+        if forecast_resolution:
             load_profiles = load_profiles.resample(forecast_resolution).interpolate(
                 limit=3
             )
@@ -244,49 +379,49 @@ class Predictor:
         forecast_resolution: str = None,
         country: str = "NL",
     ) -> pd.DataFrame:
-        # Get weather data
-        weather_params = [
-            "clouds",
-            "radiation",
-            "temp",
-            "winddeg",
-            "windspeed",
-            "windspeed_100m",
-            "pressure",
-            "humidity",
-            "rain",
-            "mxlD",
-            "snowDepth",
-            "clearSky_ulf",
-            "clearSky_dlf",
-            "ssrunoff",
-        ]
-        weather_data = Weather().get_weather_data(
+        # Locations are often given as [lat, lon] lists, make them hashable
+        if not isinstance(location, str):
+            location = tuple(location)
+
+        weather_data = self._get_weather_data(
             location,
-            weather_params,
+            WEATHER_PARAMS,
             datetime_start,
             datetime_end,
-            source="optimum",
             country=country,
         )
 
-        # Post process weather data
-        # This might not be required anymore?
-        if "source_1" in list(weather_data):
-            weather_data["source"] = weather_data.source_1
-            weather_data = weather_data.drop("source_1", axis=1)
+        # Post process weather data, only the weather parameters are predictors
+        weather_data = weather_data.drop(columns=WEATHER_DROP_COLUMNS, errors="ignore")
 
-        if "source" in list(weather_data):
-            del weather_data["source"]
-
-        if "input_city_1" in list(weather_data):
-            del weather_data["input_city_1"]
-        elif "input_city" in list(weather_data):
-            del weather_data["input_city"]
-
-        if forecast_resolution and weather_data.empty is False:
+        # The weather service already returns data on a regular (15 minute) grid,
+        # only resample when a different resolution is requested
+        if (
+            forecast_resolution
+            and not weather_data.empty
+            and weather_data.index.freq != to_offset(forecast_resolution)
+        ):
             weather_data = weather_data.resample(forecast_resolution).interpolate(
                 limit=11
             )  # 11 as GFS data has data every 3 hours
 
         return weather_data
+
+    @staticmethod
+    @cache_dataframe()
+    def _get_weather_data(
+        location: Union[Tuple[float, float], str],
+        weather_params: Tuple[str, ...],
+        datetime_start: datetime.datetime,
+        datetime_end: datetime.datetime,
+        country: str = "NL",
+    ) -> pd.DataFrame:
+        """Get weather data, cached as the same window is often requested repeatedly."""
+        return Weather().get_weather_data(
+            location,
+            list(weather_params),
+            datetime_start,
+            datetime_end,
+            source="optimum",
+            country=country,
+        )
@@ -2,12 +2,15 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import datetime
+import functools
+import time
 
 import numpy as np
 import pandas as pd
 
 DEFAULT_FREQ = "15min"
 DEFAULT_TZ = datetime.timezone.utc
+DEFAULT_CACHE_TTL = 15 * 60  # seconds
 
 
 def genereate_datetime_index(start, end, freq=None):
@@ -42,6 +45,12 @@ def process_datetime_range(start, end, freq=None):
     return datetime_start, datetime_end, datetime_index
 
 
+def to_flux_duration(freq) -> str:
+    """Convert a pandas frequency (e.g. "15min") to a Flux duration (e.g. "900s")."""
+    seconds = pd.to_timedelta(pd.tseries.frequencies.to_offset(freq)).total_seconds()
+    return f"{int(seconds)}s"
+
+
 def parse_influx_result(
     result: pd.DataFrame, aditional_indices: list[str] = None, aggfunc="mean"
 ) -> pd.DataFrame:
@@ -60,6 +69,35 @@ def parse_influx_result(
     return result
 
 
+def cache_dataframe(maxsize=128, ttl=DEFAULT_CACHE_TTL):
+    """Cache the DataFrame results of a function for a limited time.
+
+    Results are kept in an LRU cache keyed on the (hashable) arguments and are
+    reused for at most `ttl` seconds, so updated data in the database is picked up
+    eventually. The whole cache is cleared once the `ttl` period has passed, so
+    expired results are released. A copy is returned to protect the cached DataFrame.
+    """
+
+    def decorator(func):
+        cached = functools.lru_cache(maxsize=maxsize)(func)
+        ttl_period = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal ttl_period
+            current_ttl_period = int(time.monotonic() // ttl)
+            if current_ttl_period != ttl_period:
+                cached.cache_clear()
+                ttl_period = current_ttl_period
+            return cached(*args, **kwargs).copy()
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+
+    return decorator
+
+
 def _round_down_single_time_diff(time_diff, options):
     """Rounds a time difference to the first smaller option.
     Used to calculate the tAhead for forecasts.
@@ -3,17 +3,211 @@
 # SPDX-License-Identifier: MPL-2.0
 
 import unittest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
 import pandas as pd
+import pytz
 from openstef_dbc.services.predictor import Predictor
 
 
+def _frame(start, end, columns, freq="15min"):
+    index = pd.date_range(start=start, end=end, freq=freq, tz="UTC")
+    return pd.DataFrame(
+        {column: range(len(index)) for column in columns}, index=index, dtype=float
+    )
+
+
 class TestPredictor(unittest.TestCase):
-    @patch("openstef_dbc.services.predictor._DataInterface")
+    def setUp(self):
+        self.datetime_start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        self.datetime_end = datetime(2022, 1, 2, tzinfo=timezone.utc)
+        self.expected_index = pd.date_range(
+            start=self.datetime_start, end=self.datetime_end, freq="15min", tz="UTC"
+        )
+
+    @patch.object(Predictor, "get_load_profiles")
+    @patch.object(Predictor, "get_market_data")
+    @patch.object(Predictor, "get_weather_data")
+    def test_get_predictors(
+        self, get_weather_data_mock, get_market_data_mock, get_load_profiles_mock
+    ):
+        get_weather_data_mock.return_value = _frame(
+            self.datetime_start, self.datetime_end, ["temp", "radiation"]
+        )
+        get_market_data_mock.return_value = _frame(
+            self.datetime_start, self.datetime_end, ["APX"], freq="1h"
+        )
+        # Load profiles are shifted and therefore start one period early
+        get_load_profiles_mock.return_value = _frame(
+            self.datetime_start - timedelta(minutes=15),
+            self.datetime_end,
+            ["E1A_AMI_A"],
+        )
+
+        predictors = Predictor().get_predictors(
+            self.datetime_start,
+            self.datetime_end,
+            forecast_resolution="15min",
+            location="Volkel",
+        )
+
+        self.assertTrue(predictors.index.equals(self.expected_index))
+        self.assertListEqual(
+            list(predictors.columns), ["temp", "radiation", "APX", "E1A_AMI_A"]
+        )
+        self.assertEqual(predictors.index.name, "datetime")
+        self.assertTrue((predictors.dtypes == "float32").all())
+
+    @patch("openstef_dbc.services.predictor.ThreadPoolExecutor")
+    @patch.object(Predictor, "get_load_profiles")
+    @patch.object(Predictor, "get_market_data")
+    @patch.object(Predictor, "get_weather_data")
+    def test_get_predictors_only_requested_groups(
+        self,
+        get_weather_data_mock,
+        get_market_data_mock,
+        get_load_profiles_mock,
+        thread_pool_executor_mock,
+    ):
+        get_market_data_mock.return_value = _frame(
+            self.datetime_start, self.datetime_end, ["APX"]
+        )
+
+        predictors = Predictor().get_predictors(
+            self.datetime_start,
+            self.datetime_end,
+            forecast_resolution="15min",
+            predictor_groups=["market_data"],
+        )
+
+        get_weather_data_mock.assert_not_called()
+        get_load_profiles_mock.assert_not_called()
+        thread_pool_executor_mock.assert_not_called()
+        self.assertListEqual(list(predictors.columns), ["APX"])
+
+    @patch("openstef_dbc.services.predictor.Weather")
+    def test_get_weather_data_cached(self, weather_service_mock):
+        Predictor._get_weather_data.cache_clear()
+        weather_data = _frame(self.datetime_start, self.datetime_end, ["temp"])
+        weather_data["source"] = "harmonie"
+        weather_service_mock().get_weather_data.return_value = weather_data
+
+        for _ in range(2):
+            weather_data = Predictor().get_weather_data(
+                self.datetime_start,
+                self.datetime_end,
+                location=[52.0, 5.0],
+                forecast_resolution="15min",
+            )
+
+        self.assertEqual(weather_service_mock().get_weather_data.call_count, 1)
+        self.assertListEqual(list(weather_data.columns), ["temp"])
+
     @patch("openstef_dbc.services.predictor.Weather")
-    def test_get_predictors(self, weather_service_mock, data_interface_mock):
-        # TODO this is not straighforware you would have to mock all exec_sql_query
-        # calls or allow everything to be an empty dataframe
-        pass
+    def test_get_weather_data_resampled(self, weather_service_mock):
+        Predictor._get_weather_data.cache_clear()
+        weather_service_mock().get_weather_data.return_value = _frame(
+            self.datetime_start, self.datetime_end, ["temp"], freq="1h"
+        )
+
+        weather_data = Predictor().get_weather_data(
+            self.datetime_start,
+            self.datetime_end,
+            location="Volkel",
+            forecast_resolution="15min",
+        )
+
+        self.assertTrue(weather_data.index.equals(self.expected_index))
+        self.assertEqual(weather_data["temp"].iloc[1], 0.25)
+
+    @patch("openstef_dbc.services.predictor._DataInterface")
+    def test_get_load_profiles_cached(self, data_interface_mock):
+        Predictor._get_load_profiles.cache_clear()
+        data_interface_mock.get_instance().exec_influx_query.return_value = (
+            pd.DataFrame(
+                {
+                    "_time": self.expected_index[:4],
+                    "_field": "E1A_AMI_A",
+                    "_value": [1.0, 2.0, 3.0, 4.0],
+                }
+            )
+        )
+
+        # Callers create a new Predictor for every call
+        for _ in range(2):
+            load_profiles = Predictor().get_load_profiles(
+                self.datetime_start, self.datetime_end, "15min"
+            )
+
+        self.assertEqual(
+            data_interface_mock.get_instance().exec_influx_query.call_count, 1
+        )
+        self.assertListEqual(list(load_profiles.columns), ["E1A_AMI_A"])
+
+    @patch("openstef_dbc.services.predictor._DataInterface")
+    def test_empty_window_skips_query(self, data_interface_mock):
+        Predictor._get_load_profiles.cache_clear()
+        predictor = Predictor()
+        for method in [predictor.get_electricity_price, predictor.get_load_profiles]:
+            result = method(self.datetime_start, self.datetime_start, "15min")
+            self.assertTrue(result.empty)
+        data_interface_mock.get_instance.assert_not_called()
+
+    @patch("openstef_dbc.services.predictor._DataInterface")
+    def test_empty_result_is_not_shared(self, data_interface_mock):
+        data_interface_mock.get_instance().exec_influx_query.return_value = (
+            pd.DataFrame()
+        )
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+
+        result = Predictor().get_electricity_price(
+            self.datetime_start, self.datetime_end, "15min"
+        )
+        result.index.name = "modified"
+        result = Predictor().get_electricity_price(
+            self.datetime_start.astimezone(amsterdam),
+            self.datetime_end.astimezone(amsterdam),
+            "15min",
+        )
+
+        self.assertTrue(result.empty)
+        self.assertIsNone(result.index.name)
+        self.assertEqual(str(result.index.tz), "Europe/Amsterdam")
+
+    @patch.object(Predictor, "get_market_data")
+    def test_get_predictors_keeps_timezone(self, get_market_data_mock):
+        get_market_data_mock.return_value = _frame(
+            self.datetime_start, self.datetime_end, ["APX"]
+        )
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+
+        for datetime_start, datetime_end, expected_tz in [
+            (self.datetime_start, self.datetime_end, "UTC"),
+            (
+                self.datetime_start.astimezone(amsterdam),
+                self.datetime_end.astimezone(amsterdam),
+                "Europe/Amsterdam",
+            ),
+        ]:
+            predictors = Predictor().get_predictors(
+                datetime_start,
+                datetime_end,
+                forecast_resolution="15min",
+                predictor_groups=["market_data"],
+            )
+            self.assertEqual(str(predictors.index.tz), expected_tz)
+
+    @patch.object(Predictor, "get_weather_data")
+    def test_get_predictors_weather_without_location(self, get_weather_data_mock):
+        with self.assertRaises(ValueError):
+            Predictor().get_predictors(
+                self.datetime_start,
+                self.datetime_end,
+                predictor_groups=["weather_data"],
+            )
+        get_weather_data_mock.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
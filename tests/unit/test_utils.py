@@ -2,9 +2,17 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 
+import gc
 import unittest
+import weakref
+from unittest.mock import MagicMock, patch
 
-from openstef_dbc.utils import round_down_time_differences
+import pandas as pd
+from openstef_dbc.utils import (
+    cache_dataframe,
+    round_down_time_differences,
+    to_flux_duration,
+)
 
 
 class TestRoundDownTimeDifferences(unittest.TestCase):
@@ -49,5 +57,57 @@ class TestRoundDownTimeDifferences(unittest.TestCase):
         )
 
 
+class TestToFluxDuration(unittest.TestCase):
+    def test_to_flux_duration(self):
+        self.assertEqual(to_flux_duration("15min"), "900s")
+        self.assertEqual(to_flux_duration("1h"), "3600s")
+
+
+class TestCacheDataframe(unittest.TestCase):
+    def setUp(self):
+        self.func = MagicMock(return_value=pd.DataFrame({"a": [1.0, 2.0]}))
+        self.cached_func = cache_dataframe(ttl=60)(self.func)
+
+    def test_cached_result_is_reused(self):
+        self.cached_func(1, b=2)
+        self.cached_func(1, b=2)
+        self.cached_func(2, b=2)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_cached_result_is_copied(self):
+        result = self.cached_func(1)
+        result["a"] = 0.0
+        self.assertListEqual(list(self.cached_func(1)["a"]), [1.0, 2.0])
+
+    @patch("openstef_dbc.utils.time.monotonic")
+    def test_cached_result_expires(self, monotonic_mock):
+        monotonic_mock.return_value = 0
+        self.cached_func(1)
+        monotonic_mock.return_value = 61
+        self.cached_func(1)
+        self.assertEqual(self.func.call_count, 2)
+
+    @patch("openstef_dbc.utils.time.monotonic")
+    def test_expired_result_is_released(self, monotonic_mock):
+        cached_results = []
+
+        def func(key):
+            result = pd.DataFrame({"a": [float(key)]})
+            cached_results.append(weakref.ref(result))
+            return result
+
+        cached_func = cache_dataframe(ttl=60)(func)
+        monotonic_mock.return_value = 0
+        cached_func(1)
+        monotonic_mock.return_value = 61
+        cached_func(2)
+        gc.collect()
+
+        # The expired result is freed, the result of the current period is kept
+        self.assertIsNone(cached_results[0]())
+        self.assertIsNotNone(cached_results[1]())
+        self.assertEqual(cached_func.cache_info().currsize, 1)
+
+
 if __name__ == "__main__":
     unittest.main()